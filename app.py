@@ -5,21 +5,18 @@ Childcare Insights - Frontend (Streamlit)
 Streamlit UI that delegates business logic to backend and config layers.
 """
 # --- Path bootstrap: ensure project root on sys.path ---
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
-import os, sys
+import os, sys, time
 FRONTEND_DIR = os.path.dirname(os.path.abspath(__file__))
 PROJECT_ROOT = os.path.dirname(FRONTEND_DIR)
 if PROJECT_ROOT not in sys.path:
     sys.path.insert(0, PROJECT_ROOT)
 
-import pandas as pd
 import streamlit as st
 
 from configurations.config import load_settings
-from backend.cosmos_dal import CosmosDAL
-from backend.utils import is_valid_email, group_sessions_by_date
-from backend.llm_service import LLMService
-from backend.blob_io import BlobIO
+from backend.utils import is_valid_email, group_sessions_by_date, iso_now
 
 
 # ------------------------------------------------------------
@@ -28,11 +25,17 @@ from backend.blob_io import BlobIO
 st.set_page_config(
     page_title="Jon",
     page_icon="apple-only.png",  # <-- Replace "jon_icon.png" with the actual path/filename of your image
-    layout="wide"
+    layout="wide",
+    # Collapsed on the login page; re-sent as expanded on the rerun after login
+    initial_sidebar_state="expanded" if st.session_state.get("logged_in") else "collapsed",
 )
 
 def _hide_sidebar_when_unauthenticated():
-    # Hide the entire sidebar and default navigation (if any)
+    # Hide the entire sidebar and default navigation (if any).
+    # The sidebar starts collapsed, so the CSS only needs to go out once per session.
+    if "_sidebar_hidden" in st.session_state:
+        return
+    st.session_state["_sidebar_hidden"] = True
     st.markdown(
         """
         <style>
@@ -53,7 +56,8 @@ def init_state():
         "signup_mode": False,
         "active_session_id": None,
         "chat_buffer": [],
-        "rows": [], 
+        "rows_df": None, # DataFrame of the last blob listing (Arrow-backed when pyarrow is installed)
+        "start_row": 0,
     }
     for k, v in defaults.items():
         if k not in st.session_state:
@@ -63,25 +67,111 @@ init_state()
 # ------------------------------------------------------------
 # Data/services
 # ------------------------------------------------------------
+# Each service is built on first use, so the login page only pays for Cosmos.
+# Backend modules (Azure SDKs, OpenAI, pandas) are imported inside the
+# factories so the cost is paid once per server process, when needed.
+def _init_failed(e):
+    st.error(f"Service Initialization failed :{e}")
+    st.caption("If this is a Cosmos DB error, check .env and network.")
+    st.stop()
+
 @st.cache_resource
-def get_services():
+def get_settings():
     try:
-        settings = load_settings() 
-        cosmos = CosmosDAL(settings) 
-        ok, msg = cosmos.ping()
-        if not ok:
-            st.sidebar.error(msg)
-            st.error("Unable to connect to Cosmos DB. Check .env and network.")
-            st.stop()
-        llm = LLMService(settings)
-        blob = BlobIO(settings)
-        return settings, cosmos, llm, blob
+        return load_settings()
     except Exception as e:
-        st.error(f"Service Initialization failed :{e}")
-        st.stop()
+        _init_failed(e)
+
+@st.cache_resource
+def get_cosmos():
+    from backend.cosmos_dal import CosmosDAL
+    try:
+        # No separate ping: CosmosDAL already creates/reads the database and
+        # containers, so connection problems surface here on first use.
+        return CosmosDAL(get_settings())
+    except Exception as e:
+        _init_failed(e)
+
+@st.cache_resource
+def get_llm():
+    from backend.llm_service import LLMService
+    try:
+        return LLMService(get_settings())
+    except Exception as e:
+        _init_failed(e)
+
+@st.cache_resource
+def get_blob():
+    from backend.blob_io import BlobIO
+    try:
+        return BlobIO(get_settings())
+    except Exception as e:
+        _init_failed(e)
+
+@st.cache_resource
+def get_io_pool():
+    # Background pool for Cosmos writes that can overlap with LLM calls
+    return ThreadPoolExecutor(max_workers=4)
+
+# ------------------------------------------------------------
+# Cached reads (st.cache_data is shared across sessions,
+# so keys always carry the username or a user-scoped blob path)
+# ------------------------------------------------------------
+@st.cache_data(ttl=60, show_spinner=False)
+def _read_text_cached(name, max_chars):
+    # UTF-8 is at most 4 bytes per char, so this range always covers max_chars
+    data = get_blob().read_blob_range(name, 0, max_chars * 4)
+    return data.decode("utf-8", errors="replace")[:max_chars]
+
+# DataFrame previews are keyed by ETag: unchanged blobs skip the download,
+# and any overwrite changes the ETag and misses the cache.
+@st.cache_data(max_entries=32, show_spinner=False)
+def _read_csv_cached(name, etag, nrows):
+    return get_blob().read_csv_blob_preview(blob_name=name, nrows=nrows, on_bad_lines="skip")
+
+@st.cache_data(max_entries=32, show_spinner=False)
+def _read_parquet_cached(name, etag, cols):
+    kwargs = {"columns": list(cols)} if cols else {}
+    return get_blob().read_parquet_blob_df(blob_name=name, **kwargs)
+
+@st.cache_data(ttl=30, show_spinner=False)
+def _list_sessions_cached(username):
+    return get_cosmos().list_chat_sessions(username)
+
+# `version` is bumped locally on every write to the session, so reads after
+# our own writes miss the cache while switching back and forth hits it.
+@st.cache_data(ttl=30, show_spinner=False)
+def _get_session_cached(username, session_id, version):
+    return get_cosmos().get_chat_session(username, session_id)
+
+def _upload_one(blob_io, file_name, blob_path, stream, size, content_type, overwrite):
+    # Runs on a worker thread: only touches the blob client, never Streamlit
+    try:
+        blob_io.upload_blob_stream(
+            blob_name=blob_path,
+            stream=stream,
+            length=size,
+            content_type=content_type,
+            overwrite=overwrite,
+        )
+        return file_name, blob_path, size, content_type, None
+    except Exception as e:
+        return file_name, blob_path, size, content_type, e
+
+# Files uploaded in parallel; each large file also uploads its blocks with
+# max_concurrency=8, so keep this modest to stay near the blob connection pool
+UPLOAD_WORKERS = 8
+
+# Bytes preview only fetches the head of a blob
+BYTES_PREVIEW_LEN = 200
+
+# Listings are reused for a minute unless forced, and capped to keep the UI responsive
+LIST_CACHE_TTL = 60
+LIST_MAX_ROWS = 50_000
 
-# MODIFIED unpacking: ai_search_service is no longer returned
-settings, dal, llm_service, blob_io = get_services() 
+# Blob listings above this size are rendered one page at a time
+LIST_PAGINATE_THRESHOLD = 500
+LIST_PAGE_SIZE = 200
 
 # ------------------------------------------------------------
 # Shared UI
@@ -108,6 +198,8 @@ def logout():
     st.session_state["user"] = None
     st.session_state["active_session_id"] = None
     st.session_state["chat_buffer"] = []
+    st.session_state["_loaded_sid"] = None
+    st.session_state.pop("_sidebar_hidden", None)
 # ------------------------------------------------------------
 # Auth pages (rendered inside entrypoint "frame")
 # ------------------------------------------------------------
@@ -120,7 +212,7 @@ def login_page():
     col1, col2 = st.columns(2)
     with col1:
         if st.button("Login", type="primary", use_container_width=True):
-            ok, result = dal.validate_login(username, password)
+            ok, result = get_cosmos().validate_login(username, password)
             if ok:
                 # Successfully logged in: set state to True and store user details
                 st.session_state["logged_in"] = True
@@ -160,7 +252,7 @@ def signup_page():
                 st.error("Passwords do not match.")
                 return
 
-            ok, msg = dal.create_user(email, password)
+            ok, msg = get_cosmos().create_user(email, password)
             if ok:
                 st.success(msg)
                 st.session_state["signup_mode"] = False
@@ -177,11 +269,20 @@ def signup_page():
 
 # Helper to change session ID and jump to Chat page
 def switch_session(session_id):
-    st.session_state["active_session_id"] = session_id
+    # Switching is the only time the local chat buffer goes stale
+    if session_id != st.session_state.get("_loaded_sid"):
+        st.session_state["active_session_id"] = session_id
+        load_active_session()
     st.rerun()
 
 def file_upload_page():
     # Sidebar content for this page is now handled in main()
+    settings, blob_io = get_settings(), get_blob()
+    # pandas is only needed on this page, so import it lazily
+    try:
+        import pandas as pd
+    except ImportError:
+        pd = None
     
     st.header("📤 Upload Files to Azure Blob Storage")
     prefix = f"{settings.blob_folder}/{st.session_state['user']['username']}/"
@@ -196,21 +297,62 @@ def file_upload_page():
         ext_filter_raw = st.text_input("Extension filter (comma-separated)", value=".csv,.parquet,.txt", placeholder=".csv,.parquet,.txt")
         ext_filters = [e.strip() for e in ext_filter_raw.split(",") if e.strip()]
         user_loc = st.session_state['user']['username']
-        if st.button("Refresh list", type="primary"):
+        col_refresh, col_force = st.columns(2)
+        with col_refresh:
+            refresh = st.button("Refresh list", type="primary")
+        with col_force:
+            # Listings are cached for a minute; this bypasses the cache
+            force_refresh = st.button("Force refresh")
+        if force_refresh:
+            st.session_state.pop("_listing_memo", None)
+        if (refresh or force_refresh) and pd is None:
+            st.error("pandas is required to list blobs. `pip install pandas`")
+        elif refresh or force_refresh:
             try:
-                rows = blob_io.list_blobs_with_metadata(
-                    username=user_loc,
-                    recursive=recursive,
-                    extension_filter=ext_filters
-                )
-                st.session_state["rows"] = rows
-                st.success(f"Found {len(rows)} blob(s).")
+                listing_key = (user_loc, recursive, tuple(ext_filters))
+                memo = st.session_state.get("_listing_memo")
+                if memo and memo[0] == listing_key and time.monotonic() - memo[1] < LIST_CACHE_TTL:
+                    rows_df = memo[2]
+                else:
+                    # Show the first page as soon as it arrives, then keep counting
+                    rows = []
+                    progress, first_rows = st.empty(), st.empty()
+                    for page in blob_io.iter_blobs(user_loc, recursive, ext_filters):
+                        if page and not rows:
+                            first_rows.dataframe(pd.DataFrame(page[:LIST_PAGE_SIZE]), use_container_width=True)
+                        rows.extend(page)
+                        progress.caption(f"Listing... {len(rows)} blob(s) so far")
+                        if len(rows) >= LIST_MAX_ROWS:
+                            rows = rows[:LIST_MAX_ROWS]
+                            st.warning(f"Stopped after {LIST_MAX_ROWS} blobs.")
+                            break
+                    progress.empty()
+                    first_rows.empty()
+                    # Build the frame once so reruns only slice it; the memo keeps only the frame
+                    rows_df = pd.DataFrame(rows, columns=["name", "size", "last_modified", "content_type"])
+                    try:
+                        rows_df = rows_df.convert_dtypes(dtype_backend="pyarrow")
+                    except ImportError:
+                        pass  # pyarrow is optional for listing; keep the default dtypes
+                    st.session_state["_listing_memo"] = (listing_key, time.monotonic(), rows_df)
+                st.session_state["rows_df"] = rows_df
+                st.session_state["start_row"] = 0
+                st.success(f"Found {len(rows_df)} blob(s).")
             except Exception as e:
                 st.error(f"Failed to list blobs: {e}")
 
-        rows = st.session_state.get("rows", [])
-        if rows:
-            df_display = pd.DataFrame(rows) if pd else rows
+        df_display = st.session_state.get("rows_df")
+        if df_display is not None and len(df_display):
+            n_rows = len(df_display)
+            if n_rows > LIST_PAGINATE_THRESHOLD:
+                # Only send one page of rows to the browser per rerun
+                # Last page start must be a multiple of the step, or the slider can't reach it
+                max_start = (n_rows - 1) // LIST_PAGE_SIZE * LIST_PAGE_SIZE
+                if st.session_state["start_row"] > max_start:
+                    st.session_state["start_row"] = max_start
+                start = st.slider("Start row", 0, max_start, step=LIST_PAGE_SIZE, key="start_row")
+                st.caption(f"Showing rows {start + 1}-{min(start + LIST_PAGE_SIZE, n_rows)} of {n_rows}")
+                df_display = df_display.iloc[start:start + LIST_PAGE_SIZE]
             st.dataframe(df_display, use_container_width=True)
         else:
             st.info("No blobs listed yet. Click **Refresh list**.")
@@ -225,29 +367,51 @@ def file_upload_page():
         overwrite_upload = st.checkbox("Overwrite on upload", value=True)
 
         if uploaded_files and st.button("Upload", type="primary"):
+            # Each worker streams its own UploadedFile, so no file is shared across threads
+            jobs = []
             for uf in uploaded_files:
-                try:
-                    # Compose blob path: prefix / subdir / filename
-                    parts = [p for p in [prefix.strip("/"), target_subdir.strip("/"), uf.name] if p]
-                    blob_path = "/".join(parts)
-
-                    content_type = blob_io.detect_content_type(uf.name, getattr(uf, "type", None))
-                    data = uf.read()
-                    blob_io.upload_blob_bytes(
-                        blob_name = blob_path,
-                        data=data,
-                        overwrite=overwrite_upload,
-                        content_type=content_type
-                    )
-                    st.success(f"Uploaded: {blob_path} ({len(data)} bytes) | content_type={content_type}")
-                except Exception as e:
-                    st.error(f"Failed to upload {uf.name}: {e}")
+                # Compose blob path: prefix / subdir / filename
+                parts = [p for p in [prefix.strip("/"), target_subdir.strip("/"), uf.name] if p]
+                blob_path = "/".join(parts)
+                content_type = blob_io.detect_content_type(uf.name, getattr(uf, "type", None))
+                uf.seek(0)
+                jobs.append((uf.name, blob_path, uf, uf.size, content_type, overwrite_upload))
+
+            # PUTs are I/O-bound, so overlap them on a thread pool
+            results = []
+            progress = st.progress(0.0, text="Uploading...")
+            with ThreadPoolExecutor(max_workers=min(UPLOAD_WORKERS, len(jobs))) as ex:
+                futures = [ex.submit(_upload_one, blob_io, *job) for job in jobs]
+                for i, fut in enumerate(as_completed(futures), start=1):
+                    results.append(fut.result())
+                    progress.progress(i / len(futures), text=f"Uploaded {i}/{len(futures)}")
+
+            summary = [
+                {
+                    "file": file_name,
+                    "blob": blob_path,
+                    "bytes": size,
+                    "content_type": content_type,
+                    "status": "OK" if err is None else f"FAILED: {err}",
+                }
+                for file_name, blob_path, size, content_type, err in results
+            ]
+            # st.dataframe takes a list of dicts too, so the summary still shows without pandas
+            st.dataframe(pd.DataFrame(summary) if pd is not None else summary, use_container_width=True)
+
+            n_ok = sum(1 for r in results if r[-1] is None)
+            if n_ok:
+                st.success(f"Uploaded {n_ok}/{len(results)} file(s).")
+                # New blobs invalidate the cached listing
+                st.session_state.pop("_listing_memo", None)
+            if n_ok < len(results):
+                st.error(f"Failed to upload {len(results) - n_ok} file(s).")
 
     # --- Tab 3: Read / Preview ---
     with tabs[2]:
         st.subheader("Read / Preview Blob")
-        rows = st.session_state.get("rows", [])
-        options = [r["name"] for r in rows] if rows else []
+        rows_df = st.session_state.get("rows_df")
+        options = rows_df["name"].tolist() if rows_df is not None else []
         blob_choice = st.selectbox("Pick a blob from the list (if available):", options) if options else None
         blob_manual = st.text_input("Or enter a blob path manually:", value=blob_choice or "")
 
@@ -275,28 +439,30 @@ def file_upload_page():
                             chosen = "Bytes"
 
                     if chosen == "Text":
-                        text = blob_io.read_blob_text(blob_name=name,encoding="utf-8")
-                        st.code(text[:5000], language="text")  # show up to 5k chars
+                        text = _read_text_cached(name, 5000)
+                        st.code(text, language="text")  # show up to 5k chars
                     elif chosen == "CSV":
                         if pd is None:
                             st.error("pandas is required for CSV preview. `pip install pandas`")
                         else:
-                            df = blob_io.read_csv_blob_df(blob_name=name,nrows=csv_nrows)
+                            df = _read_csv_cached(name, blob_io.get_etag(name), int(csv_nrows))
                             st.dataframe(df, use_container_width=True)
                     elif chosen == "Parquet":
-                        if pd is None:
+                        try:
+                            import pyarrow  # noqa: F401
+                        except ImportError:
+                            pyarrow = None
+                        if pd is None or pyarrow is None:
                             st.error("pandas + pyarrow are required for Parquet preview. `pip install pandas pyarrow`")
                         else:
-                            kwargs = {}
                             cols = [c.strip() for c in parquet_cols.split(",") if c.strip()]
-                            if cols:
-                                kwargs["columns"] = cols
-                            df = blob_io.read_parquet_blob_df(blob_name=name,**kwargs)
+                            df = _read_parquet_cached(name, blob_io.get_etag(name), tuple(cols))
                             st.dataframe(df, use_container_width=True)
                     else:  # Bytes
-                        data = blob_io.read_blob_bytes(blob_name=name,encoding="utf-8")
-                        st.write(f"Blob size: {len(data)} bytes")
-                        st.code(data[:200].hex(), language="text")  # show first 200 bytes as hex
+                        # One range GET gives both the first bytes and the total size
+                        data, size = blob_io.read_blob_range_with_size(name, 0, BYTES_PREVIEW_LEN)
+                        st.write(f"Blob size: {size} bytes")
+                        st.code(data.hex(), language="text")  # show first 200 bytes as hex
                     st.success("Preview loaded.")
                 except Exception as e:
                     st.error(f"Failed to read/preview blob: {e}")
@@ -306,14 +472,80 @@ def file_upload_page():
 
 
 # --------------------- CHAT ---------------------
+_SYSTEM_PROMPT = "You are Jon, an AI assistant helping users with childcare center information."
+
+# Messages rendered per rerun; Cosmos still holds the full history
+CHAT_VISIBLE_MESSAGES = 50
+# Prior messages sent to the LLM with each question
+CHAT_HISTORY_MESSAGES = 10
+
+def _show_all_messages():
+    st.session_state["_show_all"] = True
+
 def load_active_session():
+    # Replace chat_buffer with the active session's history from Cosmos
     username = st.session_state["user"]["username"]
     session_id = st.session_state["active_session_id"]
     if not session_id:
         st.session_state["chat_buffer"] = []
+        st.session_state["_loaded_sid"] = None
+        st.session_state["_show_all"] = False
         return
-    session = dal.get_chat_session(username, session_id)
+    # Don't read the session before our own last write has landed
+    err = _wait_pending_write()
+    if err:
+        # Reported by the chat fragment (switch_session reruns before anything renders here)
+        st.session_state["_write_error"] = err
+    version = st.session_state.get("_session_versions", {}).get(session_id, 0)
+    session = _get_session_cached(username, session_id, version)
     st.session_state["chat_buffer"] = session.get("messages", []) if session else []
+    st.session_state["_loaded_sid"] = session_id
+    st.session_state["_show_all"] = False
+
+def _buffer_message(role, text):
+    # Add a message to the local buffer and render it
+    msg = {"role": role, "text": text, "ts": iso_now()}
+    st.session_state["chat_buffer"].append(msg)
+    _render_message(msg)
+    return msg
+
+def _stream_reply(prompt, history):
+    # Render the assistant reply token by token; returns the message dict
+    ts = iso_now()
+    with st.chat_message("assistant"):
+        reply = st.write_stream(
+            get_llm().stream_with_context(prompt, system_prompt=_SYSTEM_PROMPT, history=history)
+        )
+        st.caption(ts)
+    return {"role": "assistant", "text": reply, "ts": ts}
+
+def _render_message(msg):
+    with st.chat_message(msg["role"]):
+        st.markdown(msg["text"])
+        st.caption(msg["ts"])
+
+def _write_after(prev, dal, username, session_id, messages):
+    # Runs on the IO pool; waits for the previous turn so upserts don't race
+    if prev is not None:
+        err = prev.exception()
+        if err is not None:
+            # Surface the earlier failure through this future instead of dropping it
+            raise err
+    return dal.append_messages(username, session_id, messages)
+
+def _flush_messages(username, session_id, messages):
+    # Persist messages in the background; chat_buffer already shows them
+    versions = st.session_state.setdefault("_session_versions", {})
+    versions[session_id] = versions.get(session_id, 0) + 1
+    prev = st.session_state.get("_pending_write")
+    st.session_state["_pending_write"] = get_io_pool().submit(
+        _write_after, prev, get_cosmos(), username, session_id, messages
+    )
+
+def _wait_pending_write():
+    # Block until the last background write lands; returns its error, if any
+    pending = st.session_state.pop("_pending_write", None)
+    return pending.exception() if pending is not None else None
 
 def chat_page():
     # Header
@@ -321,14 +553,30 @@ def chat_page():
     st.markdown(f"##### **Hi {user_name}, I'm Jon your AI assistant. Ask me anything about childcare centers.** 👋")
     st.divider()
 
-    # Load active session if exists
-    load_active_session()
+    # chat_buffer is authoritative for the loaded session; only read from
+    # Cosmos when a different session is active (e.g. right after login)
+    if st.session_state.get("_loaded_sid") != st.session_state["active_session_id"]:
+        load_active_session()
 
-    # 1. Show previous messages
-    for msg in st.session_state["chat_buffer"]:
-        with st.chat_message(msg["role"]):
-            st.markdown(msg["text"])
-            st.caption(msg["ts"])
+    _chat_fragment()
+
+@st.fragment
+def _chat_fragment():
+    # Messages + input rerun on their own; the sidebar and services are untouched
+    pending = st.session_state.get("_pending_write")
+    if pending is not None and pending.done():
+        st.session_state["_write_error"] = _wait_pending_write()
+    err = st.session_state.pop("_write_error", None)
+    if err:
+        st.error(f"Failed to save the last messages: {err}")
+
+    # 1. Show previous messages (only the most recent ones unless asked for more)
+    buffer = st.session_state["chat_buffer"]
+    if len(buffer) > CHAT_VISIBLE_MESSAGES and not st.session_state.get("_show_all"):
+        st.button("Load older messages", on_click=_show_all_messages)
+        buffer = buffer[-CHAT_VISIBLE_MESSAGES:]
+    for msg in buffer:
+        _render_message(msg)
 
     # 2. Chat input
     prompt = st.chat_input("Type your message...")
@@ -341,46 +589,87 @@ def chat_page():
     # CASE A — No session exists
     # ----------------------------
     if not st.session_state["active_session_id"]:
-        # Step 1 → Send user’s input to LLM immediately
-        context = "You are Jon, an AI assistant helping users with childcare center information."
-        assistant_reply = llm_service.answer_with_context(prompt, context)
-
-        # Step 2 → Create a new session based on user's first message
-        session = dal.create_chat_session(username, prompt)
+        # Step 1 → Create a new session (stores the first user message) while the LLM runs
+        session_write = get_io_pool().submit(get_cosmos().create_chat_session, username, prompt)
+        _render_message({"role": "user", "text": prompt, "ts": iso_now()})
+
+        # Step 2 → Stream the LLM answer for the user's input
+        assistant_msg = _stream_reply(prompt, [])
+
+        err = session_write.exception()
+        if err:
+            st.error(f"Failed to create chat session: {err}")
+            return
+        session = session_write.result()
         st.session_state["active_session_id"] = session["id"]
+        st.session_state["_loaded_sid"] = session["id"]
+        st.session_state["chat_buffer"] = list(session["messages"]) + [assistant_msg]
 
-        # Step 3 → Save user + assistant messages
-        dal.append_message(username, session["id"], "user", prompt)
-        dal.append_message(username, session["id"], "assistant", assistant_reply)
+        # Step 3 → Save assistant message
+        _flush_messages(username, session["id"], [assistant_msg])
 
-        # Step 4 → Reload + rerun UI
-        load_active_session()
+        # The new session must appear in the sidebar, which lives outside
+        # this fragment: one full rerun, served from chat_buffer.
+        _list_sessions_cached.clear()
         st.rerun()
-        return
 
     # ----------------------------
     # CASE B — Existing session
     # ----------------------------
     session_id = st.session_state["active_session_id"]
 
-    # Save user message
-    dal.append_message(username, session_id, "user", prompt)
+    # Recent turns give the model the conversation so far
+    history = st.session_state["chat_buffer"][-CHAT_HISTORY_MESSAGES:]
+    user_msg = _buffer_message("user", prompt)
 
-    # LLM answer
-    context = "You are Jon, an AI assistant helping users with childcare center information."
-    assistant_reply = llm_service.answer_with_context(prompt, context)
+    # LLM answer, streamed as it is generated
+    assistant_msg = _stream_reply(prompt, history)
+    st.session_state["chat_buffer"].append(assistant_msg)
 
-    # Save assistant reply
-    dal.append_message(username, session_id, "assistant", assistant_reply)
-
-    # Refresh UI
-    load_active_session()
-    st.rerun()
+    # Save user + assistant messages in one round-trip, off the UI path
+    _flush_messages(username, session_id, [user_msg, assistant_msg])
 
 
 # ------------------------------------------------------------
 # Entry point: frame + conditional navigation
 # ------------------------------------------------------------
+# Highlight for the active session button (selected button has colored background).
+# Streamlit exposes a keyed container as the CSS class `st-key-<key>`.
+ACTIVE_CHAT_CSS = """
+    <style>
+    .st-key-active_chat_btn button {
+        background-color: #e6f7ff; /* Light blue/gray background */
+        border-color: #1890ff; /* Blue border */
+        color: #1890ff; /* Blue text */
+        font-weight: bold;
+    }
+    </style>
+"""
+
+def _sidebar_render(sessions):
+    """
+    (id, display_title, key, is_active) per session, rebuilt only when the
+    session list or the active session changes.
+    """
+    active_id = st.session_state["active_session_id"]
+    cache_key = (active_id, tuple(s["id"] for s in sessions))
+    cached = st.session_state.get("_sidebar_render")
+    if cached and cached[0] == cache_key:
+        return cached[1]
+
+    render = [
+        (
+            s["id"],
+            # Truncate title for display
+            (t := s.get("title", "Untitled Chat"))[:30] + ("..." if len(t) > 30 else ""),
+            f"prev_chat_{s['id']}",
+            s["id"] == active_id,
+        )
+        for s in sessions
+    ]
+    st.session_state["_sidebar_render"] = (cache_key, render)
+    return render
+
 def main():
     header_bar()
  
@@ -415,45 +704,22 @@ def main():
     with st.sidebar:
        
         # 3. Previous Chats Section
+        st.markdown(ACTIVE_CHAT_CSS, unsafe_allow_html=True)
         st.subheader("Previous Chats")
         username = st.session_state["user"]["username"]
         # Fetch up to the last 10 sessions, ordered by most recent update
-        sessions = dal.list_chat_sessions(username)
+        sessions = _list_sessions_cached(username)
        
         if not sessions:
             st.caption("No previous conversations.")
         else:
-            for s in sessions:
-                # Truncate title for display
-                title = s.get('title', 'Untitled Chat')
-                display_title = title[:30] + '...' if len(title) > 30 else title
-               
-                # Check if this is the active session to style the button
-                is_active = st.session_state["active_session_id"] == s["id"]
-               
-                # Use a unique key for each button
-                key = f"prev_chat_{s['id']}"
- 
-                # Use HTML/CSS to mimic the button style from the image (selected button has colored background)
-                style = ""
-                if is_active:
-                    # Apply custom styling for the active session button
-                    style = """
-                        <style>
-                        .stButton > button[key="{}"] {{
-                            background-color: #e6f7ff; /* Light blue/gray background */
-                            border-color: #1890ff; /* Blue border */
-                            color: #1890ff; /* Blue text */
-                            font-weight: bold;
-                        }}
-                        </style>
-                    """.format(key)
-                    st.markdown(style, unsafe_allow_html=True)
-               
-                # Use the unique key for the button
-                if st.button(display_title, key=key, use_container_width=True):
-                    # On click, set the active session ID and jump to the Chat page
-                    switch_session(s["id"])
+            for session_id, display_title, key, is_active in _sidebar_render(sessions):
+                # The active button sits in a keyed container so ACTIVE_CHAT_CSS can target it
+                with st.container(key="active_chat_btn") if is_active else st.container():
+                    # Use the unique key for the button
+                    if st.button(display_title, key=key, use_container_width=True):
+                        # On click, set the active session ID and jump to the Chat page
+                        switch_session(session_id)
  
         st.divider()
        
@@ -1,14 +1,19 @@
 
 # backend/blob_io.py
 #!/usr/bin/env python3
-from typing import List, Dict, Optional
+from typing import Dict, Iterator, List, Optional, Tuple
+import csv
+import functools
 import mimetypes
 import re
-from io import BytesIO, StringIO
-import pandas as pd
+import io
+from io import BytesIO
+import requests
+from requests.adapters import HTTPAdapter
 # Azure SDK
 from azure.storage.blob import BlobServiceClient, ContentSettings
 from azure.core.pipeline.transport import RequestsTransport
+from azure.core.exceptions import HttpResponseError
 
 # Suppress InsecureRequestWarning when SSL is disabled
 import urllib3
@@ -16,6 +21,87 @@ urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
 from configurations.config import Settings
 
+# Load the system MIME tables once, not on the first upload
+mimetypes.init()
+
+# Characters not allowed in a per-user blob prefix
+_UNSAFE_RE = re.compile(r"[^a-z0-9._-]")
+
+
+def _load_pandas():
+    """Import pandas on first use; returns None if it isn't installed."""
+    try:
+        import pandas as pd
+    except ImportError:
+        return None
+    return pd
+
+
+@functools.lru_cache(maxsize=4)
+def _build_service(conn_str: str, verify: bool) -> BlobServiceClient:
+    """
+    One BlobServiceClient (and one pooled requests.Session) per account and
+    SSL mode for the whole process, so every BlobIO reuses warm connections.
+    """
+    session = requests.Session()
+    # Sized for the concurrent upload workers (and their parallel block uploads)
+    adapter = HTTPAdapter(pool_connections=16, pool_maxsize=32)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    # Build a transport that can skip certificate verification if requested.
+    transport = RequestsTransport(connection_verify=verify, session=session, session_owner=False)
+    return BlobServiceClient.from_connection_string(conn_str=conn_str, transport=transport)
+
+
+def _size_from_content_range(content_range: Optional[str], default: int) -> int:
+    """Total size from a Content-Range header ("bytes 0-199/1234" or "bytes */1234")."""
+    try:
+        return int(content_range.rsplit("/", 1)[1])
+    except (AttributeError, IndexError, ValueError):
+        return default
+
+
+class _BlobRangeReader(io.RawIOBase):
+    """
+    Seekable, read-only file over a blob: every read is an HTTP Range GET,
+    so readers like pyarrow only download the byte ranges they touch.
+    """
+
+    def __init__(self, blob_client):
+        self._blob = blob_client
+        self._size = blob_client.get_blob_properties().size
+        self._pos = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self._pos
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_SET:
+            self._pos = offset
+        elif whence == io.SEEK_CUR:
+            self._pos += offset
+        elif whence == io.SEEK_END:
+            self._pos = self._size + offset
+        else:
+            raise ValueError(f"invalid whence: {whence}")
+        return self._pos
+
+    def readinto(self, b) -> int:
+        if self._pos >= self._size:
+            return 0
+        length = min(len(b), self._size - self._pos)
+        data = self._blob.download_blob(offset=self._pos, length=length).readall()
+        n = len(data)
+        b[:n] = data
+        self._pos += n
+        return n
+
 
 class BlobIO:
     """
@@ -27,6 +113,9 @@ class BlobIO:
         convenience per-user helpers.
     """
 
+    # Containers already created/checked in this process
+    _ensured: set = set()
+
     def __init__(self, settings: Settings):
         self._settings = settings
 
@@ -34,14 +123,8 @@ class BlobIO:
         raw_skip = str(getattr(settings, "ssl_cert", "")).strip().lower()
         skip_ssl = raw_skip in {"0", "false", "no", "n", "off"}
 
-        # Build a transport that can skip certificate verification if requested.
-        transport = RequestsTransport(connection_verify=not skip_ssl)
-
-        # Create BlobServiceClient from connection string, with the custom transport.
-        self._service: BlobServiceClient = BlobServiceClient.from_connection_string(
-            conn_str=settings.storage_connection_string,
-            transport=transport,
-        )
+        # Shared BlobServiceClient from connection string, with the custom transport.
+        self._service: BlobServiceClient = _build_service(settings.storage_connection_string, not skip_ssl)
 
         self._container_name = settings.storage_container_name
         # Normalize root folder prefix (no leading/trailing slashes)
@@ -49,19 +132,22 @@ class BlobIO:
 
         # Ensure container client exists (create container if it doesn't exist)
         self._container = self._service.get_container_client(self._container_name)
-        try:
-            self._container.create_container()
-        except Exception:
-            # If already exists or insufficient permissions, ignore.
-            pass
+        if self._container.url not in BlobIO._ensured:
+            try:
+                self._container.create_container()
+            except Exception:
+                # If already exists or insufficient permissions, ignore.
+                pass
+            BlobIO._ensured.add(self._container.url)
 
     # ---------- Helpers ----------
 
     @staticmethod
+    @functools.lru_cache(maxsize=1024)
     def _safe_username(username: str) -> str:
         """Normalize username for prefix usage."""
         u = username.strip().lower()
-        return re.sub(r"[^a-z0-9._-]", "-", u)
+        return _UNSAFE_RE.sub("-", u)
 
     def _user_prefix(self, username: str) -> str:
         """Return the path prefix for a given user."""
@@ -76,63 +162,83 @@ class BlobIO:
         """
         if uploaded_type:
             return uploaded_type
-        guessed, _ = mimetypes.guess_type(filename)
-        return guessed
+        _, dot, ext = filename.rpartition(".")
+        if not dot:
+            return None
+        ext = "." + ext.lower()
+        if ext in mimetypes.encodings_map or ext in mimetypes.suffix_map:
+            # Compound names (a.tar.gz, a.csv.gz, a.tgz) depend on more than the last suffix
+            return mimetypes.guess_type(filename)[0]
+        return self._guess_ext(ext)
+
+    @staticmethod
+    @functools.lru_cache(maxsize=256)
+    def _guess_ext(ext: str) -> Optional[str]:
+        """Extension (e.g. '.csv') -> MIME type, cached across uploads."""
+        return mimetypes.guess_type("x" + ext)[0]
 
     # ---------- Generic Blob Operations (settings-aware) ----------
 
-    def list_blobs_with_metadata(
+    def iter_blobs(
         self,
         username: str,
         recursive: bool = False,
         extension_filter: Optional[List[str]] = None,
-    ) -> List[Dict]:
+        page_size: int = 500,
+    ) -> Iterator[List[Dict]]:
         """
-        List blobs (with metadata) under an optional prefix.
+        Yield blob rows under the user's prefix one service page at a time,
+        so callers can show the first rows after a single round-trip.
 
-        If `username` is provided, the prefix becomes:
-            <root_prefix>/<username>[/<blob_folder>]
-        else if `blob_folder` is provided, prefix becomes:
-            <blob_folder>/
-        else lists all blobs in the container.
+        The prefix is:
+            <root_prefix>/<username>/
 
-        Returns: list of dicts {name, size, last_modified, content_type}
+        With `recursive=False` only direct children of the prefix are returned.
+        `extension_filter` is applied client-side to each page (one request per page).
+
+        Yields: lists of dicts {name, size, last_modified, content_type}
         """
 
         container_client = self._service.get_container_client(self._container_name)
         # Compose prefix
         blob_folders = self._root_prefix+'/'+username
         prefix = blob_folders.strip("/")+ "/" if (blob_folders and blob_folders.strip()) else None
-        rows: List[Dict] = []
-
-        # Choose iterator based on `recursive`
-        iterator = container_client.walk_blobs(name_starts_with=prefix) if recursive \
-            else container_client.list_blobs(name_starts_with=prefix)
-
-        for item in iterator:
-            if hasattr(item, "name"):
-                name = item.name
-                if extension_filter:
-                    if not any(name.lower().endswith(ext.lower()) for ext in extension_filter):
-                        continue
-
-                content_type = None
-                cs = getattr(item, "content_settings", None)
-                if cs:
-                    # content_settings may be an object with attribute or dict-like
-                    try:
-                        content_type = cs.content_type
-                    except AttributeError:
-                        content_type = cs.get("content_type") if isinstance(cs, dict) else None
-
-                rows.append({
-                    "name": name,
-                    "size": getattr(item, "size", None),
-                    "last_modified": getattr(item, "last_modified", None),
-                    "content_type": content_type,
-                })
-
-        return rows
+        plen = len(prefix or "")
+
+        # list_blobs pages already carry size/last_modified/content_type, so rows are
+        # built straight from them; str.endswith accepts a tuple for the suffix check.
+        exts = tuple(ext.lower() for ext in extension_filter) if extension_filter else None
+        pages = container_client.list_blobs(name_starts_with=prefix, results_per_page=page_size).by_page()
+        for page in pages:
+            yield [
+                self._blob_row(item) for item in page
+                if (recursive or "/" not in item.name[plen:])
+                and (exts is None or item.name.lower().endswith(exts))
+            ]
+
+    def list_blobs_with_metadata(
+        self,
+        username: str,
+        recursive: bool = False,
+        extension_filter: Optional[List[str]] = None,
+    ) -> List[Dict]:
+        """
+        List all blobs (with metadata) under the user's prefix.
+        Materializes iter_blobs; see there for the filtering rules.
+
+        Returns: list of dicts {name, size, last_modified, content_type}
+        """
+        return [row for page in self.iter_blobs(username, recursive, extension_filter) for row in page]
+
+    @staticmethod
+    def _blob_row(item) -> Dict:
+        """Flatten BlobProperties into the row dict used by the UI."""
+        return {
+            "name": item.name,
+            "size": item.size,
+            "last_modified": item.last_modified,
+            "content_type": getattr(item.content_settings, "content_type", None),
+        }
 
     def upload_blob_bytes(
         self,
@@ -150,6 +256,38 @@ class BlobIO:
         blob_client.upload_blob(data=data, overwrite=overwrite, content_settings=cs)
         return blob_client.url
 
+    def upload_blob_stream(
+        self,
+        blob_name: str,
+        stream,
+        length: Optional[int] = None,
+        content_type: Optional[str] = None,
+        overwrite: bool = True,
+    ) -> str:
+        """
+        Upload a file-like object without materializing it in memory.
+        The SDK chunks the stream into blocks and PUTs them concurrently.
+        Returns the blob URL.
+        """
+        cs = ContentSettings(content_type=content_type) if content_type else None
+        blob_client = self._container.get_blob_client(blob=blob_name)
+        blob_client.upload_blob(
+            data=stream,
+            length=length,
+            overwrite=overwrite,
+            content_settings=cs,
+            blob_type="BlockBlob",
+            max_concurrency=8,
+        )
+        return blob_client.url
+
+    def get_etag(self, blob_name: str) -> str:
+        """
+        Return the blob's current ETag (properties only, no content download).
+        """
+        blob_client = self._container.get_blob_client(blob=blob_name)
+        return blob_client.get_blob_properties().etag
+
     def read_blob_bytes(self, blob_name: str) -> bytes:
         """
         Read an entire blob into memory as bytes.
@@ -158,31 +296,117 @@ class BlobIO:
         stream = blob_client.download_blob()
         return stream.readall()
 
-    def read_blob_text(self, blob_name: str, encoding: str = "utf-8") -> str:
+    def read_blob_range(self, blob_name: str, offset: int = 0, length: int = 65536) -> bytes:
         """
-        Read a blob into memory as decoded text.
+        Read `length` bytes starting at `offset` with a single HTTP Range GET.
+        Returns fewer bytes if the blob ends first (b"" for an empty blob).
         """
-        raw = self.read_blob_bytes(blob_name)
-        return raw.decode(encoding)
+        return self.read_blob_range_with_size(blob_name, offset, length)[0]
+
+    def read_blob_range_with_size(self, blob_name: str, offset: int = 0, length: int = 65536) -> Tuple[bytes, int]:
+        """
+        Like read_blob_range, but also returns the blob's total size, taken from
+        the same response's Content-Range (no extra properties request).
+        """
+        blob_client = self._container.get_blob_client(blob=blob_name)
+        try:
+            downloader = blob_client.download_blob(offset=offset, length=length)
+        except HttpResponseError as e:
+            # 416 InvalidRange: the range starts at/after the end (e.g. a 0-byte blob).
+            # The SDK only recovers from this itself when no range was requested.
+            if e.status_code != 416:
+                raise
+            content_range = e.response.headers.get("Content-Range") if e.response is not None else None
+            return b"", _size_from_content_range(content_range, offset)
+        data = downloader.readall()
+        return data, _size_from_content_range(downloader.properties.content_range, offset + len(data))
 
     def read_csv_blob_df(self, blob_name: str, **read_csv_kwargs):
         """
         Read a CSV blob directly into a pandas DataFrame (in-memory).
         Requires pandas.
         """
+        pd = _load_pandas()
         if pd is None:
             raise ImportError("pandas is required to load CSV preview.")
-        text = self.read_blob_text(blob_name, encoding="utf-8")
-        return pd.read_csv(StringIO(text), **read_csv_kwargs)
+        # Download straight into one buffer and let pandas decode it,
+        # instead of holding bytes, str and StringIO copies at once.
+        buf = BytesIO()
+        blob_client = self._container.get_blob_client(blob=blob_name)
+        blob_client.download_blob(max_concurrency=4).readinto(buf)
+        buf.seek(0)
+        return pd.read_csv(buf, **read_csv_kwargs)
 
-    def read_parquet_blob_df(self, blob_name: str, **read_parquet_kwargs):
+    def read_csv_blob_preview(self, blob_name: str, nrows: int = 20, chunk_size: int = 64 * 1024, **read_csv_kwargs):
         """
-        Read a Parquet blob directly into a pandas DataFrame (in-memory).
-        Requires pandas + pyarrow.
+        Read the first `nrows` rows of a CSV blob, downloading only as many
+        `chunk_size` ranges as needed to cover the header plus `nrows` lines.
+        Requires pandas.
         """
+        pd = _load_pandas()
         if pd is None:
+            raise ImportError("pandas is required to load CSV preview.")
+        buf = bytearray()
+        offset = 0
+        while True:
+            chunk, size = self.read_blob_range_with_size(blob_name, offset, chunk_size)
+            buf += chunk
+            offset += len(chunk)
+            if offset >= size or not chunk:
+                break  # reached the end of the blob (never request a range past it)
+            if buf.count(b"\n") > nrows + 1:
+                # Drop the partial last line
+                del buf[buf.rfind(b"\n") + 1:]
+                break
+        return pd.read_csv(BytesIO(buf), nrows=nrows, **read_csv_kwargs)
+
+    def iter_csv_batches(self, blob_name: str, block_size: int = 8 << 20, as_strings: bool = False):
+        """
+        Stream a CSV blob as pyarrow RecordBatches of roughly `block_size` bytes.
+        The blob is fetched through range reads as the parser advances, so peak
+        memory stays around one block instead of the whole file. Requires pyarrow.
+        With as_strings=True every column is read as text (empty fields -> null),
+        which avoids type-inference failures on later blocks.
+        """
+        try:
+            import pyarrow as pa
+            import pyarrow.csv as pacsv
+        except ImportError:
+            raise ImportError("pyarrow is required to stream CSV batches.")
+        blob_client = self._container.get_blob_client(blob=blob_name)
+        reader = io.BufferedReader(_BlobRangeReader(blob_client), buffer_size=block_size)
+        read_options = pacsv.ReadOptions(block_size=block_size)
+        convert_options = None
+        if as_strings:
+            # Read just the header line; the rewind stays inside the BufferedReader's
+            # buffer, so the parse below doesn't download those bytes again
+            header = reader.readline().decode("utf-8-sig")
+            names = next(csv.reader([header]), [])
+            reader.seek(0)
+            convert_options = pacsv.ConvertOptions(
+                column_types={name: pa.string() for name in names},
+                strings_can_be_null=True,
+            )
+        batches = pacsv.open_csv(reader, read_options=read_options, convert_options=convert_options)
+        for batch in batches:
+            yield batch
+
+    def read_parquet_blob_df(self, blob_name: str, columns: Optional[List[str]] = None):
+        """
+        Read a Parquet blob into a pandas DataFrame (Arrow-backed dtypes).
+        Only the footer and the column chunks for `columns` are downloaded,
+        via range reads. Requires pandas + pyarrow.
+        """
+        pd = _load_pandas()
+        try:
+            import pyarrow.parquet as pq
+        except ImportError:
+            pq = None
+        if pd is None or pq is None:
             raise ImportError("pandas + pyarrow is required to load Parquet preview.")
-        data = self.read_blob_bytes(blob_name)
-        return pd.read_parquet(BytesIO(data), **read_parquet_kwargs)
-
-
+        blob_client = self._container.get_blob_client(blob=blob_name)
+        # Buffer reads so pyarrow's small footer/metadata reads don't each cost a GET
+        reader = io.BufferedReader(_BlobRangeReader(blob_client), buffer_size=1 << 20)
+        pf = pq.ParquetFile(reader)
+        table = pf.read(columns=columns) if columns else pf.read()
+        return table.to_pandas(types_mapper=pd.ArrowDtype)
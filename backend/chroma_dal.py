@@ -1,7 +1,9 @@
 # backend/chroma_dal.py
 
+import hashlib
 import os
 import time
+import threading
 from typing import List, Dict, Optional
 # Import for rate limit handling
 from tenacity import retry, wait_random_exponential, stop_after_attempt, retry_if_exception_type 
@@ -11,7 +13,30 @@ from chromadb import Client, Collection
 from chromadb.config import Settings as ChromaSettings
 from configurations.config import Settings
 from openai import AzureOpenAI
-from openai import RateLimitError, APIError # Import specific OpenAI exceptions
+from backend.openai_client import get_openai_client
+from openai import RateLimitError, APIError, APIConnectionError, APITimeoutError # Import specific OpenAI exceptions
+
+# Transient failures worth retrying (APITimeoutError is also an APIConnectionError)
+_RETRYABLE = (RateLimitError, APIConnectionError, APITimeoutError)
+
+
+def _retry_after_or_backoff(max_wait: float):
+    """
+    tenacity wait: honour the server's Retry-After on 429s, otherwise jittered
+    exponential backoff from 100 ms, capped at `max_wait` seconds.
+    """
+    backoff = wait_random_exponential(multiplier=0.1, max=max_wait)
+
+    def wait(retry_state) -> float:
+        response = getattr(retry_state.outcome.exception(), "response", None)
+        retry_after = response.headers.get("retry-after") if response is not None else None
+        try:
+            return min(float(retry_after), max_wait) if retry_after else backoff(retry_state)
+        except ValueError:  # HTTP-date form; not worth parsing
+            return backoff(retry_state)
+
+    return wait
+
 
 # --- Embedding Helper with Rate Limit Logic ---
 class AzureOpenAIChromaEmbeddings:
@@ -19,53 +44,75 @@ class AzureOpenAIChromaEmbeddings:
     A wrapper to use the AzureOpenAI client for ChromaDB embedding.
     Includes rate limit handling (retry with exponential backoff).
     """
-    def __init__(self, settings: Settings):
+    # Azure OpenAI accepts up to 2048 inputs per embeddings request
+    MAX_BATCH = 2048
+
+    def __init__(self, settings: Settings, client: Optional[AzureOpenAI] = None):
         self._settings = settings
-        self._client = AzureOpenAI(
-            api_key=settings.openai_key,
-            api_version=settings.openai_api_version,
-            azure_endpoint=settings.openai_endpoint,
-        )
+        self._client = client or get_openai_client(settings)
         self._deployment = settings.embedding_model_name
+        # Only sent when configured; older models (ada-002) reject `dimensions`
+        self._extra = {"dimensions": settings.embedding_dimensions} if settings.embedding_dimensions else {}
 
-    # Apply tenacity retry logic for RateLimitError
+    # Apply tenacity retry logic for rate limits and transient network errors
     @retry(
-        wait=wait_random_exponential(min=1, max=10), # Wait between 1 and 10 seconds
+        wait=_retry_after_or_backoff(10),            # Retry-After, else 0.1s..10s jittered
         stop=stop_after_attempt(6),                  # Retry up to 6 times
-        retry=retry_if_exception_type(RateLimitError) # Only retry on rate limit errors
+        retry=retry_if_exception_type(_RETRYABLE)
     )
     def embed_documents(self, texts: List[str]) -> List[List[float]]:
         # Azure OpenAI batch embedding handles list of strings efficiently
         response = self._client.embeddings.create(
             model=self._deployment,
             input=texts,
+            **self._extra,
         )
         return [item.embedding for item in response.data]
 
-    # Required by some Chroma/LangChain interfaces (used for single query embedding)
+    # Chroma 1.x calls embed_query(input=[...]) for query texts and expects one vector per item
     @retry(
-        wait=wait_random_exponential(min=1, max=4),
+        wait=_retry_after_or_backoff(4),
         stop=stop_after_attempt(3),
-        retry=retry_if_exception_type(RateLimitError)
+        retry=retry_if_exception_type(_RETRYABLE)
     )
-    def embed_query(self, text: str) -> List[float]:
+    def embed_query(self, input) -> List[List[float]]:
+        if isinstance(input, str):
+            input = [input]
         response = self._client.embeddings.create(
             model=self._deployment,
-            input=[text],
+            input=list(input),
+            **self._extra,
         )
-        return response.data[0].embedding
+        return [item.embedding for item in response.data]
+
+    # Single-string convenience used by RAGService's query-embedding cache
+    def embed_text(self, text: str) -> List[float]:
+        return self.embed_query([text])[0]
+
+    # Newer Chroma versions identify embedding functions by name when reopening a collection
+    @staticmethod
+    def name() -> str:
+        return "azure_openai_chroma"
 
-    # Implement __call__ for compatibility if Chroma requires it (it usually calls embed_documents/embed_query)
-    def __call__(self, text):
-        return self.embed_query(text)
+    # Chroma's EmbeddingFunction protocol: __call__(input: list[str]) -> list of vectors.
+    # The parameter must be named `input`; Chroma checks the signature.
+    def __call__(self, input):
+        if isinstance(input, str):
+            return self.embed_query([input])
+        vectors: List[List[float]] = []
+        for start in range(0, len(input), self.MAX_BATCH):
+            vectors.extend(self.embed_documents(input[start:start + self.MAX_BATCH]))
+        return vectors
 
 
 class ChromaDAL:
-    def __init__(self, settings: Settings):
+    def __init__(self, settings: Settings, openai_client: Optional[AzureOpenAI] = None):
         self._settings = settings
         
-        # 1. Setup persistence directory (ensures storage on the App Service persistent volume)
-        self._base_dir = os.path.join(os.getcwd(), "chromadb")
+        # 1. Setup persistence directory (ensures storage on the App Service persistent volume).
+        # CHROMA_PERSIST_DIR can point at faster local disk (NVMe/tmpfs) so the HNSW files stay
+        # in the page cache; that trades durability for speed, since local disk is lost on restart.
+        self._base_dir = settings.chroma_persist_dir or os.path.join(os.getcwd(), "chromadb")
         if not os.path.exists(self._base_dir):
             os.makedirs(self._base_dir)
 
@@ -78,24 +125,68 @@ class ChromaDAL:
         )
         
         # 3. Initialize the correct embedding function (Azure OpenAI with Rate Limiting)
-        self._embed_func = AzureOpenAIChromaEmbeddings(settings)
+        self._embed_func = AzureOpenAIChromaEmbeddings(settings, openai_client)
 
-    def _user_collection_name(self, username: str, file_name: str) -> str:
+        # 4. Collection handles by name, so searches don't rebuild them per query
+        self._collection_cache: Dict[str, Collection] = {}
+        self._collection_lock = threading.Lock()
+
+        # 5. Load every collection's index in the background before the first user query
+        threading.Thread(target=self._prewarm, name="chroma-prewarm", daemon=True).start()
+
+    def _prewarm(self) -> None:
+        """
+        Chroma loads a collection's HNSW index on first query; run one tiny query
+        per collection (using a stored vector, so no dimension guessing) and cache
+        the handles. Best effort: failures only mean a colder first query.
+        """
+        try:
+            names = [getattr(c, "name", c) for c in self._client.list_collections()]
+        except Exception:
+            return
+        for name in names:
+            try:
+                collection = self._client.get_collection(name=name, embedding_function=self._embed_func)
+                sample = collection.peek(limit=1)["embeddings"]
+                if sample is not None and len(sample):
+                    collection.query(query_embeddings=[sample[0]], n_results=1, include=[])
+                with self._collection_lock:
+                    self._collection_cache.setdefault(name, collection)
+            except Exception:
+                continue
+
+    @property
+    def base_dir(self) -> str:
+        """Chroma persistence directory (other on-disk indexes can live alongside)."""
+        return self._base_dir
+
+    @property
+    def embedding_function(self) -> AzureOpenAIChromaEmbeddings:
+        """The shared embedder, for callers that embed documents themselves (e.g. ingest)."""
+        return self._embed_func
+
+    def _user_collection_name(self, username: str) -> str:
         """
-        Creates a unique, sanitized collection name for a user's file.
+        Name of a user's document collection (all of their files). Hashing the
+        normalized username keeps names valid for Chroma and distinct per user
+        (no sanitizer or length cap can map two usernames to the same collection).
         """
-        safe_name = ''.join(e for e in file_name if e.isalnum() or e in ['_', '-']).strip().replace(' ', '_')
-        safe_user = username.strip().lower().replace("@", "_").replace(" ", "_")
-        return f"{safe_user}_{safe_name}"[:63] 
+        digest = hashlib.blake2b(username.strip().lower().encode("utf-8")).hexdigest()
+        return f"u_{digest[:40]}"
 
     # --- KEY FUNCTION FOR INDEX REUSE ---
-    def get_or_create_collection(self, username: str, file_name: str) -> Collection:
+    def get_or_create_collection(self, username: str) -> Collection:
         """
-        Gets a Chroma collection if it exists, otherwise creates it.
-        This ensures existing collections are reused, avoiding re-indexing.
+        Gets the user's Chroma collection if it exists, otherwise creates it.
+        Every file the user ingests lives here, tagged with `file_name` metadata.
+        Handles are cached, so repeated calls skip the Chroma lookup.
         """
-        name = self._user_collection_name(username, file_name)
-        
+        name = self._user_collection_name(username)
+        with self._collection_lock:
+            collection = self._collection_cache.get(name)
+        if collection is not None:
+            return collection
+
         # Chroma's get_or_create handles the check and creation logic
         collection = self._client.get_or_create_collection(
             name=name,
@@ -103,48 +194,40 @@ class ChromaDAL:
             embedding_function=self._embed_func,
             metadata={
                 "username": username,
-                "file_name": file_name,
             }
         )
         
         # NOTE: If a collection exists, it is loaded (reused). If it doesn't, it is created.
+        with self._collection_lock:
+            self._collection_cache[name] = collection
         return collection
         
-    def vector_search_user(self, username: str, query_vector: List[float], k: int = 5) -> List[Dict]:
+    def vector_search_user(
+        self,
+        username: str,
+        query_vector: List[float],
+        k: int = 5,
+        file_names: Optional[List[str]] = None,
+    ) -> List[Dict]:
         """
-        Searches all collections belonging to a user.
+        Searches the user's documents (one ANN query over their collection).
+        Pass `file_names` to restrict the search to those files; Chroma applies
+        the metadata filter during the search, so up to k filtered hits still come back.
         """
-        # (Implementation remains the same as previously defined)
-        # ...
-        collections = self._client.list_collections()
-        # Simple filter: checks if the collection name starts with the user's sanitized name
-        safe_user_prefix = self._user_collection_name(username, "")[:-1] # Get user prefix
-        
-        results: List[Dict] = []
-        
-        # In a complex app, you might want to only query collections listed in the metadata that belong to the user
-        for collection_dict in collections:
-            # Re-initialize collection object using get_collection to ensure it has the embedding_function
-            collection_name = collection_dict.name 
-            if collection_name.startswith(safe_user_prefix):
-                collection = self._client.get_collection(name=collection_name, embedding_function=self._embed_func)
-
-                res = collection.query(
-                    query_embeddings=[query_vector],
-                    n_results=k,
-                    include=['documents', 'metadatas', 'distances']
-                )
-                
-                # Reformat results
-                for doc, meta, dist in zip(res['documents'][0], res['metadatas'][0], res['distances'][0]):
-                    results.append({
-                        "document": doc,
-                        "metadata": meta,
-                        "score": 1 - dist,
-                    })
-        
-        results.sort(key=lambda x: x['score'], reverse=True)
-        return results[:k]
-    
+        # Chunks carry their owner; filtering on it guards against any collection mix-up
+        where: Dict = {"username": username}
+        if file_names:
+            where = {"$and": [where, {"file_name": {"$in": file_names}}]}
+        collection = self.get_or_create_collection(username)
+        res = collection.query(
+            query_embeddings=[query_vector],
+            n_results=k,
+            where=where,
+            include=['documents', 'metadatas', 'distances']
+        )
 
-    
\ No newline at end of file
+        # Reformat results (already ordered nearest first)
+        return [
+            {"document": doc, "metadata": meta, "score": 1 - dist}
+            for doc, meta, dist in zip(res['documents'][0], res['metadatas'][0], res['distances'][0])
+        ]
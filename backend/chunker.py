@@ -1,28 +1,31 @@
 
 # backend/chunker.py
-from typing import List
-import pandas as pd
+from typing import Iterable, Iterator, List
 
-def csv_rows_to_chunks(csv_bytes: bytes, rows_per_chunk: int = 100) -> List[str]:
-    """
-    Convert CSV bytes into text chunks. Each chunk contains up to rows_per_chunk rows.
-    """
-    df = pd.read_csv(pd.io.common.BytesIO(csv_bytes))
-    chunks: List[str] = []
-    cols = list(df.columns)
+def _batch_row_texts(batch) -> List[str]:
+    """"col: val; col: val" for every row of a pyarrow RecordBatch, built with Arrow kernels."""
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    if batch.num_columns == 0:
+        return []
+    parts = [
+        pc.binary_join_element_wise(f"{name}: ", pc.fill_null(pc.cast(col, pa.string()), "nan"), "")
+        for name, col in zip(batch.schema.names, batch.columns)
+    ]
+    return pc.binary_join_element_wise(*parts, "; ").to_pylist()
 
-    # Build row textual representation
-    def row_to_text(row) -> str:
-        parts = [f"{c}: {row[c]}" for c in cols]
-        return "; ".join(parts)
 
-    # Group rows into chunks
+def record_batches_to_chunks(batches: Iterable, rows_per_chunk: int = 100) -> Iterator[str]:
+    """
+    Convert CSV record batches (see BlobIO.iter_csv_batches, ideally with
+    as_strings=True so values keep their CSV text) into text chunks. Each chunk
+    contains up to rows_per_chunk rows; chunks may span batch boundaries.
+    """
     buf: List[str] = []
-    for _, row in df.iterrows():
-        buf.append(row_to_text(row))
-        if len(buf) >= rows_per_chunk:
-            chunks.append("\n".join(buf))
-            buf = []
+    for batch in batches:
+        buf.extend(_batch_row_texts(batch))
+        while len(buf) >= rows_per_chunk:
+            yield "\n".join(buf[:rows_per_chunk])
+            del buf[:rows_per_chunk]
     if buf:
-        chunks.append("\n".join(buf))
-    return chunks
+        yield "\n".join(buf)
@@ -7,9 +7,23 @@ from azure.cosmos import CosmosClient, PartitionKey
 from azure.cosmos.exceptions import CosmosResourceNotFoundError, CosmosHttpResponseError
 
 from configurations.config import Settings
-from backend.security import hash_password
+from backend.security import hash_password, verify_password, needs_rehash
 from backend.utils import sanitize_title, iso_now
 
+# Serves list_chat_sessions' "type = ... ORDER BY updated_at DESC" from the index.
+# Only applied when the container is created; existing containers keep their policy.
+CHATS_INDEXING_POLICY = {
+    "indexingMode": "consistent",
+    "includedPaths": [{"path": "/*"}],
+    "excludedPaths": [{"path": "/\"_etag\"/?"}],
+    "compositeIndexes": [
+        [
+            {"path": "/type", "order": "ascending"},
+            {"path": "/updated_at", "order": "descending"},
+        ]
+    ],
+}
+
 class CosmosDAL:
     """
     Data Access Layer for Cosmos DB (NoSQL API).
@@ -30,6 +44,7 @@ class CosmosDAL:
         self._chats = self._database.create_container_if_not_exists(
             id="chats",
             partition_key=PartitionKey(path="/username"),
+            indexing_policy=CHATS_INDEXING_POLICY,
         )
 
     # ---- Users ----
@@ -62,8 +77,16 @@ class CosmosDAL:
         user = self.get_user(username)
         if not user:
             return False, "User not found."
-        if user.get("password_hash") != hash_password(password, self._settings.password_salt):
+        stored = user.get("password_hash", "")
+        if not verify_password(password, stored, self._settings.password_salt):
             return False, "Incorrect password."
+        if needs_rehash(stored):
+            # Upgrade legacy SHA-256 (or older scrypt) hashes now that we have the plaintext
+            user["password_hash"] = hash_password(password, self._settings.password_salt)
+            try:
+                self._users.upsert_item(user)
+            except CosmosHttpResponseError:
+                pass  # keep the old hash; retried on the next login
         return True, user
 
     # ---- Chats ----
@@ -96,6 +119,23 @@ class CosmosDAL:
         except CosmosResourceNotFoundError:
             return None
 
+    def append_messages(self, username: str, session_id: str, messages: List[Dict]) -> Optional[Dict]:
+        """
+        Append several messages (e.g. user + assistant of one turn) with a single upsert.
+        Messages without a `ts` are stamped with the same timestamp.
+        """
+        try:
+            session = self._chats.read_item(item=session_id, partition_key=username)
+            ts = iso_now()
+            session["messages"].extend(
+                {"role": m["role"], "text": m["text"], "ts": m.get("ts") or ts} for m in messages
+            )
+            session["updated_at"] = ts
+            self._chats.upsert_item(session)
+            return session
+        except CosmosResourceNotFoundError:
+            return None
+
     def get_chat_session(self, username: str, session_id: str) -> Optional[Dict]:
         try:
             return self._chats.read_item(item=session_id, partition_key=username)
@@ -103,10 +143,11 @@ class CosmosDAL:
             return None
 
     def list_chat_sessions(self, username: str) -> List[Dict]:
-        query = "SELECT c.id, c.title, c.created_at, c.updated_at FROM c WHERE c.type = 'chat_session'"
-        items = list(self._chats.query_items(query=query, partition_key=username))
-        items.sort(key=lambda x: x.get("updated_at", ""), reverse=True)
-        return items
+        query = (
+            "SELECT c.id, c.title, c.created_at, c.updated_at FROM c "
+            "WHERE c.type = 'chat_session' ORDER BY c.updated_at DESC"
+        )
+        return list(self._chats.query_items(query=query, partition_key=username))
 
     # ---- Diagnostics ----
     def ping(self) -> Tuple[bool, str]:
@@ -0,0 +1,53 @@
+
+# backend/embedding_cache.py
+import hashlib
+import sqlite3
+import threading
+from typing import Dict, List, Sequence
+
+import numpy as np
+
+
+class EmbeddingCache:
+    """
+    Persistent content-addressed cache of document embeddings (sqlite).
+    Keys are blake2b(model tag + text), so a different deployment or vector
+    size never returns stale vectors. Safe to share across threads.
+    """
+
+    # Stay under sqlite's bound-parameter limit in IN (...) queries
+    _LOOKUP_BATCH = 900
+
+    def __init__(self, path: str, model_tag: str):
+        self._model_tag = model_tag
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS embed_cache (hash TEXT PRIMARY KEY, dim INTEGER, vec BLOB)"
+            )
+
+    def key(self, text: str) -> str:
+        return hashlib.blake2b(f"{self._model_tag}\0{text}".encode("utf-8")).hexdigest()
+
+    def get_many(self, keys: Sequence[str]) -> Dict[str, List[float]]:
+        found: Dict[str, List[float]] = {}
+        with self._lock:
+            for start in range(0, len(keys), self._LOOKUP_BATCH):
+                part = keys[start:start + self._LOOKUP_BATCH]
+                rows = self._conn.execute(
+                    f"SELECT hash, vec FROM embed_cache WHERE hash IN ({','.join('?' * len(part))})",
+                    part,
+                ).fetchall()
+                for h, vec in rows:
+                    found[h] = np.frombuffer(vec, dtype=np.float32).tolist()
+        return found
+
+    def put_many(self, items: Dict[str, List[float]]) -> None:
+        rows = [
+            (h, len(v), np.asarray(v, dtype=np.float32).tobytes())
+            for h, v in items.items()
+        ]
+        with self._lock, self._conn:
+            self._conn.executemany("INSERT OR REPLACE INTO embed_cache VALUES (?, ?, ?)", rows)
@@ -1,30 +1,71 @@
 
 # backend/llm_service.py
-from typing import List
+from typing import Dict, Iterator, List, Optional
 from openai import AzureOpenAI
 from configurations.config import Settings
+from backend.openai_client import get_openai_client
 
 class LLMService:
-    def __init__(self, settings: Settings):
+    def __init__(self, settings: Settings, client: Optional[AzureOpenAI] = None):
         self._settings = settings
-        self._client = AzureOpenAI(
-            api_key=settings.openai_key,
-            api_version=settings.openai_api_version,
-            azure_endpoint=settings.openai_endpoint,
-        )
+        self._client = client or get_openai_client(settings)
         self._chat_deployment = settings.openai_deployment_name
 
     # --- Chat Completion ---
-    def answer_with_context(self, question: str, context: str) -> str:
-        system_prompt = (
+    def _build_messages(
+        self,
+        question: str,
+        context: str = "",
+        system_prompt: Optional[str] = None,
+        history: Optional[List[Dict]] = None,
+    ) -> List[dict]:
+        """
+        System prompt first, then prior turns, then the question. Keeping the
+        system prompt identical across requests lets Azure OpenAI reuse the
+        cached prompt prefix.
+        """
+        system_prompt = system_prompt or (
             "You are a helpful AI assistant."
         )
-        messages = [
+        content = f"Question: {question}\n\nContext:\n{context}" if context else question
+        return [
             {"role": "system", "content": system_prompt},
-            {"role": "user", "content": f"Question: {question}\n\nContext:\n{context}"},
+            *({"role": m["role"], "content": m["text"]} for m in (history or [])),
+            {"role": "user", "content": content},
         ]
+
+    def answer_with_context(
+        self,
+        question: str,
+        context: str = "",
+        system_prompt: Optional[str] = None,
+        history: Optional[List[Dict]] = None,
+    ) -> str:
+        """
+        `history` is a list of chat messages ({"role", "text"}) sent before the question.
+        """
         resp = self._client.chat.completions.create(
             model=self._chat_deployment,
-            messages=messages
+            messages=self._build_messages(question, context, system_prompt, history)
+        )
+        return resp.choices[0].message.content
+
+    def stream_with_context(
+        self,
+        question: str,
+        context: str = "",
+        system_prompt: Optional[str] = None,
+        history: Optional[List[Dict]] = None,
+    ) -> Iterator[str]:
+        """
+        Same as answer_with_context, but yields content deltas as they arrive.
+        """
+        stream = self._client.chat.completions.create(
+            model=self._chat_deployment,
+            messages=self._build_messages(question, context, system_prompt, history),
+            stream=True,
         )
-        return resp.choices[0].message.content
\ No newline at end of file
+        for chunk in stream:
+            # Azure may send chunks with no choices (e.g. content filter results)
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
@@ -0,0 +1,28 @@
+
+# backend/openai_client.py
+import functools
+
+import httpx
+from openai import AzureOpenAI, DefaultHttpxClient
+from configurations.config import Settings
+
+
+@functools.lru_cache(maxsize=4)
+def _build_client(endpoint: str, api_key: str, api_version: str) -> AzureOpenAI:
+    """
+    One AzureOpenAI client (and one httpx connection pool) per endpoint for the
+    whole process, shared by chat, embeddings and RAG.
+    """
+    return AzureOpenAI(
+        api_key=api_key,
+        api_version=api_version,
+        azure_endpoint=endpoint,
+        # Sized for the embedding fan-out during ingest plus concurrent chats
+        http_client=DefaultHttpxClient(
+            limits=httpx.Limits(max_connections=64, max_keepalive_connections=32)
+        ),
+    )
+
+
+def get_openai_client(settings: Settings) -> AzureOpenAI:
+    return _build_client(settings.openai_endpoint, settings.openai_key, settings.openai_api_version)
@@ -1,105 +1,171 @@
 
 # backend/rag_service.py
-from typing import List, Dict
-from openai import AzureOpenAI
+import functools
+import hashlib
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import time
+from collections import OrderedDict
+from typing import List, Dict, Tuple
 from configurations.config import Settings
 from backend.blob_io import BlobIO
 #from backend.ai_search_service import AISearchService
 from backend.llm_service import LLMService
-from backend.chunker import csv_rows_to_chunks
+from backend.chunker import record_batches_to_chunks
 from backend.chroma_dal import ChromaDAL
+from backend.embedding_cache import EmbeddingCache
 
 
 class RAGService:
+    # Answer cache: (username, question hash, top_k) -> (timestamp, answer)
+    ANSWER_TTL_SECONDS = 3600
+    ANSWER_CACHE_SIZE = 1000
+    # Chunks per embeddings request during ingest (Azure accepts up to 2048 inputs)
+    EMBED_BATCH = 256
+    EMBED_WORKERS = 8
+    # Chunks per collection.add call during ingest
+    ADD_BATCH = 250
+    # Query embeddings kept in memory (deterministic per deployment, never invalidated)
+    QUERY_EMBED_CACHE_SIZE = 1024
+
     def __init__(self, settings: Settings, blob_io: BlobIO, chroma_dal: ChromaDAL, llm_service: LLMService):
         self._settings = settings
+        self._answers: "OrderedDict[Tuple[str, str, int], Tuple[float, str]]" = OrderedDict()
+        self._answers_lock = threading.Lock()  # service instance is shared across sessions
         self._blob = blob_io
         self._chroma = chroma_dal
         self._llm = llm_service
 
-        # Embedding client (Azure OpenAI)
-        self._embed_client = AzureOpenAI(
-            api_key=settings.openai_key,
-            api_version=settings.openai_api_version,
-            azure_endpoint=settings.openai_endpoint,
+        # Query embeddings go through the Chroma embedder (same model, retries, dimensions).
+        # Per-instance LRU, so the cache dies with the service (and its deployment)
+        self._embed_query_cached = functools.lru_cache(maxsize=self.QUERY_EMBED_CACHE_SIZE)(self._embed_query)
+        # Chunk embeddings on disk by content hash, so re-ingesting a file only embeds changed chunks
+        self._embed_cache = EmbeddingCache(
+            os.path.join(chroma_dal.base_dir, "embed_cache.sqlite"),
+            model_tag=f"{settings.embedding_model_name}:{settings.embedding_dimensions or ''}",
         )
-        self._embedding_deployment = settings.embedding_model_name  # set to "text-embedding-3-large" in .env
 
     # ----- Ingestion pipeline -----
     def ingest_csv_blob(self, username: str, blob_name: str, rows_per_chunk: int = 100) -> Dict:
         """
-        Download CSV from Blob Storage, chunk, embed vectors, and upsert into the user's ChromaDB collection.
+        Stream CSV from Blob Storage, chunk, embed vectors, and upsert into the user's ChromaDB collection.
+        Chunks are tagged with file_name; ids ("<blob_name>::<n>") are unique across the user's files.
         """
-        # 1) Get/Create Collection (replace ensure_user_index)
-        collection = self._chroma.get_or_create_collection(username, blob_name) # <-- MODIFIED
+        # Embedding batches are independent requests; run a few at once.
+        # embed_documents retries on 429s, so bursts back off on their own.
+        texts: List[str] = []
+        embed_futures = []
+        with ThreadPoolExecutor(max_workers=self.EMBED_WORKERS) as ex:
+            # 1) Get/Create the Collection (replace ensure_user_index) in the background...
+            collection_future = ex.submit(self._chroma.get_or_create_collection, username) # <-- MODIFIED
 
-        # 2) Download bytes
-        csv_bytes = self._blob.read_blob_bytes(blob_name)
+            # 2) ...while the CSV streams in as record batches, 3) is chunked and
+            # 4) each full batch of chunks is sent for embedding as soon as it exists
+            chunks = record_batches_to_chunks(
+                self._blob.iter_csv_batches(blob_name, as_strings=True), rows_per_chunk=rows_per_chunk
+            )
+            for text in chunks:
+                texts.append(text)
+                if len(texts) % self.EMBED_BATCH == 0:
+                    embed_futures.append(ex.submit(self._embed_chunks, texts[-self.EMBED_BATCH:]))
+            tail = len(texts) % self.EMBED_BATCH
+            if tail:
+                embed_futures.append(ex.submit(self._embed_chunks, texts[-tail:]))
 
-        # 3) Chunk
-        chunks = csv_rows_to_chunks(csv_bytes, rows_per_chunk=rows_per_chunk)
-    
-        # NEW: Prepare documents, metadata, and embeddings list for ChromaDB bulk insert
-        texts = []
-        metadatas = []
-        ids = []
-    
-        for i, text in enumerate(chunks, start=1):
-        # The content and metadata are prepared, but we still need the vector for ChromaDB's add method.
-        # Unlike Azure Search, we can just add the text/metadata/ID and let Chroma/LangChain handle the embedding (if using LangChain)
-        # OR we can pass the vectors explicitly. Sticking to explicit vectors for consistency with previous RAG logic:
-            emb = self._embed_client.embeddings.create(
-            model=self._embedding_deployment,
-            input=text,
+            vectors: List[List[float]] = []
+            for future in embed_futures:  # submission order == chunk order
+                vectors.extend(future.result())
+            collection = collection_future.result()
+
+        metadatas = [
+            {"username": username, "file_name": blob_name, "chunk_no": i}
+            for i in range(1, len(texts) + 1)
+        ]
+        ids = [f"{blob_name}::{i}" for i in range(1, len(texts) + 1)]
+
+        # 5) Replace this file's chunks in ChromaDB, ADD_BATCH chunks per call (bounded request size).
+        # add() keeps existing ids unchanged, so drop the previous version of the file first;
+        # this also removes chunks beyond the new file's length. Done after embedding succeeded.
+        collection.delete(where={"file_name": blob_name})
+        started = time.perf_counter()
+        for start in range(0, len(texts), self.ADD_BATCH):
+            end = start + self.ADD_BATCH
+            collection.add(
+                embeddings=vectors[start:end], # one vector per chunk, in order
+                documents=texts[start:end],
+                metadatas=metadatas[start:end],
+                ids=ids[start:end],
             )
-            vec = emb.data[0].embedding # list[float]
-        
-            texts.append(text)
-            metadatas.append({
-            "username": username,
-            "file_name": blob_name,
-            "chunk_no": i,
-            })
-            ids.append(f"{blob_name}::{i}")
-
-        # 5) Upsert into ChromaDB
-        # NOTE: The add method will overwrite documents with the same ID, effectively "upserting".
-        collection.add(
-            embeddings=vec, # ADDED: Need to pass the vectors explicitly
-            documents=texts,
-            metadatas=metadatas,
-            ids=ids,
-        )
-    
-        # 6) Return result
-        return {"collection_name": collection.name, "chunks_uploaded": len(texts)}
+        add_seconds = time.perf_counter() - started
+
+        # 6) Cached answers for this user may now be out of date
+        self._drop_cached_answers(username)
+
+        # 7) Return result
+        return {
+            "collection_name": collection.name,
+            "chunks_uploaded": len(texts),
+            "add_chunks_per_sec": round(len(texts) / add_seconds, 1) if add_seconds else None,
+        }
     
+    def _embed_chunks(self, texts: List[str]) -> List[List[float]]:
+        """Embed one batch of chunks, calling the API only for texts not in the embedding cache."""
+        keys = [self._embed_cache.key(t) for t in texts]
+        cached = self._embed_cache.get_many(keys)
+        misses = {k: t for k, t in zip(keys, texts) if k not in cached}  # also dedupes repeats
+        if misses:
+            fresh = self._chroma.embedding_function.embed_documents(list(misses.values()))
+            new = dict(zip(misses, fresh))
+            self._embed_cache.put_many(new)
+            cached.update(new)
+        return [cached[k] for k in keys]
+
     # backend/rag_service.py (Modified Query)
 
+    def _drop_cached_answers(self, username: str) -> None:
+        with self._answers_lock:
+            for key in [k for k in self._answers if k[0] == username]:
+                del self._answers[key]
+
     def answer_with_rag(self, username: str, question: str, top_k: int = 5) -> str:
         """
         Embed query, vector-search relevant chunks in the user's ChromaDB, and pass the best context to GPT-4o.
+        Repeated questions within ANSWER_TTL_SECONDS are served from an in-process cache.
         """
+        key = (username, hashlib.blake2b(question.encode("utf-8")).hexdigest(), top_k)
+        with self._answers_lock:
+            hit = self._answers.get(key)
+            if hit and time.monotonic() - hit[0] < self.ANSWER_TTL_SECONDS:
+                self._answers.move_to_end(key)
+                return hit[1]
+
+        answer = self._answer_with_rag(username, question, top_k)
+        with self._answers_lock:
+            self._answers[key] = (time.monotonic(), answer)
+            self._answers.move_to_end(key)
+            while len(self._answers) > self.ANSWER_CACHE_SIZE:
+                self._answers.popitem(last=False)
+        return answer
+
+    def _embed_query(self, question: str) -> Tuple[float, ...]:
+        # Tuple so cached vectors can't be mutated by callers
+        return tuple(self._chroma.embedding_function.embed_text(question))
+
+    def _answer_with_rag(self, username: str, question: str, top_k: int) -> str:
         # 1) Embed query with the SAME embedding model
-        q = self._embed_client.embeddings.create(model=self._embedding_deployment, input=question)
-        qvec = q.data[0].embedding
+        qvec = list(self._embed_query_cached(question))
 
-        # 2) Search ChromaDB (using all collections for the user's data)
+        # 2) Search ChromaDB (the user's collection holds all of their files)
         # The ChromaDAL needs a method to search across all user data or by a query-specific filter.
         # For simplicity, we'll assume a way to search all user documents:
         results = self._chroma.vector_search_user(username, qvec, k=top_k) # <-- NEW CALL
 
-        # Compose context string from the top chunks
-        ctx_lines = []
-        for r in results:
-            # Assuming search results structure: (document, metadata, score)
-            doc = r.get("document", "No content")
-            meta = r.get("metadata", {})
-            file_name = meta.get('file_name', 'N/A')
-            chunk_no = meta.get('chunk_no', 'N/A')
-            
-            ctx_lines.append(f"[{file_name} | chunk {chunk_no}] {doc}")
-            
-        context = "\n\n---\n".join(ctx_lines) if ctx_lines else "No relevant chunks found."
+        # Compose context string from the top chunks (one join, no intermediate list)
+        def ctx_line(r: Dict) -> str:
+            meta = r.get("metadata") or {}
+            return f"[{meta.get('file_name', 'N/A')} | chunk {meta.get('chunk_no', 'N/A')}] {r.get('document', 'No content')}"
+
+        context = "\n\n---\n".join(ctx_line(r) for r in results) or "No relevant chunks found."
 
         return self._llm.answer_with_context(question, context)
\ No newline at end of file
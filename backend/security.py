@@ -1,10 +1,52 @@
 
 # backend/security.py
 import hashlib
+import hmac
+import os
+
+# scrypt cost parameters (~16 MiB memory per hash); stored with each hash so
+# they can be raised later without breaking existing accounts
+SCRYPT_N = 2 ** 14
+SCRYPT_R = 8
+SCRYPT_P = 1
+SCRYPT_DKLEN = 32
+
+
+def _scrypt(password: str, pepper: str, salt: bytes, n: int, r: int, p: int, dklen: int) -> bytes:
+    material = f"{pepper}:{password}".encode("utf-8")
+    return hashlib.scrypt(material, salt=salt, n=n, r=r, p=p, dklen=dklen)
+
+
+def _legacy_sha256(password: str, salt: str) -> str:
+    # Pre-scrypt format: sha256("<salt>:<password>") as 64 hex chars
+    return hashlib.sha256(f"{salt}:{password}".encode("utf-8")).hexdigest()
+
 
 def hash_password(password: str, salt: str) -> str:
     """
-    Demo hashing using SHA-256 + salt. Replace with bcrypt/Argon2 for production.
+    scrypt with a random per-user salt; `salt` (the app-wide setting) is mixed in as a pepper.
+    Returns "scrypt$n$r$p$<salt hex>$<hash hex>".
     """
-    material = f"{salt}:{password}".encode("utf-8")
-    return hashlib.sha256(material).hexdigest()
+    user_salt = os.urandom(16)
+    digest = _scrypt(password, salt, user_salt, SCRYPT_N, SCRYPT_R, SCRYPT_P, SCRYPT_DKLEN)
+    return f"scrypt${SCRYPT_N}${SCRYPT_R}${SCRYPT_P}${user_salt.hex()}${digest.hex()}"
+
+
+def verify_password(password: str, stored: str, salt: str) -> bool:
+    """Check a password against a stored hash (scrypt, or the legacy SHA-256 format)."""
+    if not stored:
+        return False
+    if not stored.startswith("scrypt$"):
+        return hmac.compare_digest(stored, _legacy_sha256(password, salt))
+    try:
+        _, n, r, p, salt_hex, hash_hex = stored.split("$")
+        expected = bytes.fromhex(hash_hex)
+        digest = _scrypt(password, salt, bytes.fromhex(salt_hex), int(n), int(r), int(p), len(expected))
+    except ValueError:
+        return False
+    return hmac.compare_digest(digest, expected)
+
+
+def needs_rehash(stored: str) -> bool:
+    """True for legacy hashes or scrypt hashes made with older cost parameters."""
+    return not stored.startswith(f"scrypt${SCRYPT_N}${SCRYPT_R}${SCRYPT_P}$")
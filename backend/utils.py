@@ -3,43 +3,50 @@
 import re
 from datetime import datetime, timedelta
 
+_TITLE_BAD = re.compile(r"[^A-Za-z0-9\-\._ ]+")
+_WS = re.compile(r"\s+")
+_EMAIL_RE = re.compile(r"^[\w\.-]+@[\w\.-]+\.\w+$")
+
 def sanitize_title(s: str, max_len: int = 60) -> str:
     s = (s or "").strip()
     if not s:
         s = "untitled_chat"
-    s = re.sub(r"[^A-Za-z0-9\-\._ ]+", "_", s)
-    s = re.sub(r"\s+", "_", s)
+    s = _TITLE_BAD.sub("_", s)
+    s = _WS.sub("_", s)
     return s[:max_len]
 
 def iso_now() -> str:
     return datetime.utcnow().isoformat()
 
 def is_valid_email(e: str) -> bool:
-    return re.match(r"^[\w\.-]+@[\w\.-]+\.\w+$", e or "") is not None
+    return _EMAIL_RE.match(e or "") is not None
 
 def group_sessions_by_date(sessions):
     """
     Group sessions by Today, Yesterday, Past 7 Days, Older.
     sessions: list of dicts with updated_at/created_at ISO timestamps
+    ISO dates sort as strings, so buckets come from the "YYYY-MM-DD" prefix without parsing.
     """
     groups = {"Today": [], "Yesterday": [], "Past 7 Days": [], "Older": []}
     now = datetime.now()
     today = now.date()
-    yesterday = today - timedelta(days=1)
-    week_ago = today - timedelta(days=7)
+    today_s = today.isoformat()
+    yesterday_s = (today - timedelta(days=1)).isoformat()
+    week_ago_s = (today - timedelta(days=7)).isoformat()
 
     for s in sessions:
-        dt_str = s.get("updated_at", s.get("created_at"))
-        try:
-            dt = datetime.fromisoformat(dt_str)
-        except Exception:
-            dt = now
-        d = dt.date()
-        if d == today:
+        dt_str = s.get("updated_at", s.get("created_at")) or ""
+        d = dt_str[:10]
+        if len(d) != 10 or d[4] != "-" or d[7] != "-":
+            try:
+                d = datetime.fromisoformat(dt_str).date().isoformat()
+            except Exception:
+                d = today_s
+        if d == today_s:
             groups["Today"].append(s)
-        elif d == yesterday:
+        elif d == yesterday_s:
             groups["Yesterday"].append(s)
-        elif d >= week_ago:
+        elif d >= week_ago_s:
             groups["Past 7 Days"].append(s)
         else:
             groups["Older"].append(s)
@@ -32,6 +32,12 @@ class Settings:
     ai_search_admin_key: str
     ai_search_index_name: str
 
+    # Optional: ask text-embedding-3 models for shorter vectors (e.g. 512)
+    embedding_dimensions: Optional[int] = None
+
+    # Optional: Chroma persistence directory (defaults to ./chromadb)
+    chroma_persist_dir: Optional[str] = None
+
 def load_settings(env_path: Optional[str] = None) -> Settings:
     load_dotenv(dotenv_path=env_path)
 
@@ -45,6 +51,7 @@ def load_settings(env_path: Optional[str] = None) -> Settings:
     openai_api_version = os.getenv("AZURE_OPENAI_API_VERSION", "").strip()
     openai_deployment_name = os.getenv("AZURE_DEPLOYMENT_NAME", "").strip()
     embedding_model_name = os.getenv("AZURE_EMBEDDING_MODEL_NAME", "").strip()
+    embedding_dimensions = os.getenv("AZURE_EMBEDDING_DIMENSIONS", "").strip()
 
     storage_connection_string = os.getenv("AZURE_STORAGE_CONNECTION_STRING", "").strip()
     storage_container_name = os.getenv("AZURE_CONTAINER_NAME", "").strip()
@@ -56,6 +63,8 @@ def load_settings(env_path: Optional[str] = None) -> Settings:
     ai_search_admin_key = os.getenv("AZURE_AI_SEARCH_ADMIN_KEY", "").strip()
     ai_search_index_name = os.getenv("AZURE_AI_SEARCH_INDEX_NAME","").strip()
 
+    chroma_persist_dir = os.getenv("CHROMA_PERSIST_DIR", "").strip()
+
     # Minimal validation
     if not storage_connection_string or not storage_container_name:
         raise RuntimeError("Missing Azure Storage settings in .env")
@@ -86,4 +95,6 @@ def load_settings(env_path: Optional[str] = None) -> Settings:
         ai_search_endpoint=ai_search_endpoint,
         ai_search_admin_key=ai_search_admin_key,
         ai_search_index_name=ai_search_index_name,
+        embedding_dimensions=int(embedding_dimensions) if embedding_dimensions else None,
+        chroma_persist_dir=chroma_persist_dir or None,
     )